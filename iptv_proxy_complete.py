@@ -4,60 +4,179 @@ IPTV Multi-Proxy Service - Versión Profesional Integrada
 Sistema completo de gestión de proxies e IPTV con interfaz de administración
 """
 
+import atexit
+import base64
+import fcntl
+import http.client
 import os
+import socket
 import sys
+import tempfile
 import logging
+import logging.handlers
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session, flash, Response, make_response
+import jinja2
+from flask import Flask, jsonify, request, redirect, url_for, session, flash, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from werkzeug.security import generate_password_hash, check_password_hash
-from functools import wraps
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from functools import lru_cache, wraps
+import hashlib
+import queue
+import sqlite3
 import threading
 import time
 import json
+import orjson
 import requests
-from typing import List, Dict, Optional, Tuple
+from apscheduler.schedulers.background import BackgroundScheduler
+from flask.json.provider import JSONProvider
+from requests.adapters import HTTPAdapter, Retry
+from cachetools import TTLCache
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from typing import Iterator, List, Dict, Optional, Tuple
 import re
 from urllib.parse import urlparse
 
-# Configuración de logging profesional
+# Crear directorio de logs si no existe
+os.makedirs('logs', exist_ok=True)
+
+# Configuración de logging profesional: los handlers reales (fichero
+# rotativo y consola) viven detrás de un QueueListener, así el logging
+# en los handlers de peticiones es un Queue.put sin I/O de disco
+_log_queue = queue.Queue(-1)
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+_log_file_handler = logging.handlers.RotatingFileHandler(
+    'logs/iptv_proxy.log', maxBytes=50_000_000, backupCount=5
+)
+_log_file_handler.setFormatter(_log_formatter)
+
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(_log_formatter)
+
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, _log_file_handler, _log_stream_handler
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# El QueueHandler solo interpola el mensaje; asctime y nivel los añade
+# el formatter de los handlers del listener
+_log_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/iptv_proxy.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[_log_queue_handler]
 )
 logger = logging.getLogger(__name__)
 
-# Crear directorio de logs si no existe
-os.makedirs('logs', exist_ok=True)
-
 class Config:
     """Configuración centralizada de la aplicación"""
+    # Ruta absoluta para SQLite: con una ruta relativa Flask-SQLAlchemy
+    # la resuelve bajo instance/ y un checkout limpio no puede arrancar
+    BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+    DATA_DIR = os.path.join(BASE_DIR, 'data')
+    DATABASE_PATH = os.path.join(DATA_DIR, 'iptv_proxy.db')
+
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'tu-clave-super-secreta-cambiala-en-produccion'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///data/iptv_proxy.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{DATABASE_PATH}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MAX_RETRIES = int(os.environ.get('MAX_RETRIES', 3))
     PROXY_TIMEOUT = int(os.environ.get('PROXY_TIMEOUT', 15))
+    # URL ligera servida desde CDN para probar proxies (204 sin cuerpo),
+    # evita los límites de peticiones de httpbin
+    PROXY_TEST_URL = os.environ.get('PROXY_TEST_URL', 'http://www.gstatic.com/generate_204')
+    ACCESS_LOG_RETENTION_DAYS = int(os.environ.get('ACCESS_LOG_RETENTION_DAYS', 30))
     VALIDATION_INTERVAL = int(os.environ.get('VALIDATION_INTERVAL', 300))  # 5 minutos
     RATE_LIMIT_DEFAULT = os.environ.get('RATE_LIMIT_DEFAULT', "100/hour")
+    # Con varios workers el almacenamiento en memoria multiplica los
+    # límites por worker: en producción apuntar a Redis
+    LIMITER_STORAGE_URI = os.environ.get('LIMITER_REDIS', 'memory://')
+
+    # Opciones del engine: timeout corto, conexiones compartibles entre
+    # threads (Flask threaded=True) y ping antes de reutilizar del pool
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'connect_args': {'timeout': 5, 'check_same_thread': False},
+            'pool_pre_ping': True
+        }
+    else:
+        SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True}
 
 # Crear directorio de datos si no existe
-os.makedirs('data', exist_ok=True)
+os.makedirs(Config.DATA_DIR, exist_ok=True)
+
+class ORJSONProvider(JSONProvider):
+    """Proveedor JSON basado en orjson: codifica en C y serializa
+    datetime de forma nativa, sin pasar por isoformat() en Python"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=str).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 # Inicialización de la aplicación
 app = Flask(__name__)
 app.config.from_object(Config)
+app.json = ORJSONProvider(app)
+
+# Renderer de templates: compilados una vez y cacheados sin límite; sin
+# auto_reload no hay stat() del fichero por render
+app.jinja_env.auto_reload = False
+app.jinja_env.cache_size = -1
+
+# Caché de bytecode Jinja en disco: un proceso recién arrancado (worker
+# de gunicorn, reinicio) carga los templates ya compilados en lugar de
+# re-parsearlos
+_jinja_bc_dir = os.path.join(Config.DATA_DIR, 'jinja_bc')
+os.makedirs(_jinja_bc_dir, exist_ok=True)
+app.jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache(_jinja_bc_dir, '%s.cache')
 
 # Extensiones
 db = SQLAlchemy(app)
+
+@sqlalchemy_event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Aplica PRAGMAs de rendimiento a cada conexión SQLite nueva.
+
+    WAL permite lectores y escritores en paralelo y reduce los fsync;
+    synchronous=NORMAL sigue siendo seguro bajo WAL y es mucho más rápido.
+    """
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64MB de caché de páginas
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256MB vía mmap
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+@sqlalchemy_event.listens_for(Engine, "close")
+def _optimize_sqlite_on_close(dbapi_conn, connection_record):
+    """Ejecuta PRAGMA optimize al cerrar la conexión (mantiene estadísticas)"""
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    try:
+        dbapi_conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        pass
+
 limiter = Limiter(
     app,
     key_func=get_remote_address,
+    storage_uri=Config.LIMITER_STORAGE_URI,
+    strategy='fixed-window-elastic-expiry',
     default_limits=[Config.RATE_LIMIT_DEFAULT]
 )
 
@@ -65,6 +184,11 @@ limiter = Limiter(
 # MODELOS DE BASE DE DATOS
 # ============================================================================
 
+# Hasher Argon2 con coste calibrado a ~30 ms por verificación: mucho más
+# barato que el PBKDF2 de 600k iteraciones que usa Werkzeug por defecto,
+# manteniendo un KDF fuerte para el almacenamiento
+_password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
 class User(db.Model):
     """Modelo de usuario con diferentes niveles de acceso"""
     id = db.Column(db.Integer, primary_key=True)
@@ -79,10 +203,30 @@ class User(db.Model):
     bandwidth_used = db.Column(db.BigInteger, default=0)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _password_hasher.hash(password)
+        # Un cambio de contraseña invalida las credenciales cacheadas
+        if self.id is not None:
+            invalidate_user_caches(self.id, self.username)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash.startswith('$argon2'):
+            try:
+                _password_hasher.verify(self.password_hash, password)
+            except (VerificationError, InvalidHashError):
+                # InvalidHashError: hash truncado/corrupto en la BD; debe
+                # comportarse como credencial inválida, no como un 500
+                return False
+            if _password_hasher.check_needs_rehash(self.password_hash):
+                self.password_hash = _password_hasher.hash(password)
+            return True
+
+        # Hash PBKDF2 heredado de Werkzeug: verificar con el mecanismo
+        # antiguo y migrar a Argon2 en caliente (se persiste en el
+        # commit del propio login)
+        if check_password_hash(self.password_hash, password):
+            self.password_hash = _password_hasher.hash(password)
+            return True
+        return False
 
     def to_dict(self):
         return {
@@ -91,8 +235,8 @@ class User(db.Model):
             'is_premium': self.is_premium,
             'is_admin': self.is_admin,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
+            'created_at': self.created_at,
+            'last_login': self.last_login,
             'usage_count': self.usage_count,
             'bandwidth_used': self.bandwidth_used
         }
@@ -134,14 +278,27 @@ class Proxy(db.Model):
             'success_rate': self.success_rate,
             'success_count': self.success_count,
             'failure_count': self.failure_count,
-            'last_checked': self.last_checked.isoformat() if self.last_checked else None,
+            'last_checked': self.last_checked,
             'response_time': self.response_time,
             'status_message': self.status_message,
             'priority': self.priority
         }
 
+# Índice compuesto que cubre el filtro y el orden de get_best_proxy:
+# la búsqueda se resuelve con un seek de una sola fila
+db.Index(
+    'ix_proxy_active_pri_rt',
+    Proxy.is_active,
+    Proxy.priority.desc(),
+    Proxy.response_time
+)
+
 class M3USource(db.Model):
     """Modelo para múltiples fuentes M3U"""
+    # Nombre de tabla explícito: la conversión automática genera
+    # 'm3_u_source' y rompe la ForeignKey 'm3u_source.id' de Channel
+    __tablename__ = 'm3u_source'
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     url = db.Column(db.String(500), nullable=False)
@@ -158,7 +315,7 @@ class M3USource(db.Model):
             'name': self.name,
             'url': self.url,
             'is_active': self.is_active,
-            'last_updated': self.last_updated.isoformat() if self.last_updated else None,
+            'last_updated': self.last_updated,
             'channels_count': self.channels_count,
             'status': self.status,
             'error_message': self.error_message
@@ -173,7 +330,9 @@ class Channel(db.Model):
     m3u_source_id = db.Column(db.Integer, db.ForeignKey('m3u_source.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    urls = db.relationship('ChannelURL', backref='channel', lazy='dynamic', cascade='all, delete-orphan')
+    # selectin precarga las URLs de todos los canales en una sola
+    # consulta extra, evitando el N+1 de lazy='dynamic' al iterarlos
+    urls = db.relationship('ChannelURL', backref='channel', lazy='selectin', cascade='all, delete-orphan')
 
 class ChannelURL(db.Model):
     """URLs de canal con estadísticas de uso"""
@@ -204,55 +363,107 @@ class AccessLog(db.Model):
     response_time = db.Column(db.Float)
     success = db.Column(db.Boolean, default=True)
 
+# Índice compuesto para analíticas por usuario: convierte el escaneo del
+# índice de timestamp en un range seek por (user_id, timestamp)
+db.Index('ix_access_log_user_ts', AccessLog.user_id, AccessLog.timestamp.desc())
+
 # ============================================================================
 # GESTOR DE PROXIES
 # ============================================================================
 
+# PROXY_TEST_URL es constante tras el arranque: se parsea una sola vez
+# aquí en lugar de en cada sonda CONNECT
+_PROBE_TARGET_HOST = urlparse(Config.PROXY_TEST_URL).hostname or 'example.com'
+
 class ProxyManager:
     """Gestor inteligente de proxies con balanceeo de carga"""
     
     def __init__(self):
-        self.validation_thread = None
-        self.running = False
-    
+        self.scheduler = None
+        self._monitor_lock_file = None
+        # Sesión compartida para reutilizar conexiones TCP/TLS entre
+        # tests; sin reintentos automáticos (el fallo ya es el resultado)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=128,
+            pool_maxsize=128,
+            max_retries=Retry(total=0)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
     def start_monitoring(self):
-        """Inicia el monitoreo automático de proxies"""
-        if self.validation_thread and self.validation_thread.is_alive():
+        """Inicia el monitoreo automático de proxies.
+
+        Con varios workers (gunicorn), un flock no bloqueante garantiza
+        que solo uno de ellos ejecute la validación periódica.
+        """
+        if self.scheduler is not None:
             return
-        
-        self.running = True
-        self.validation_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.validation_thread.start()
+
+        lock_path = os.path.join(tempfile.gettempdir(), 'iptv_proxy.monitor.lock')
+        self._monitor_lock_file = open(lock_path, 'w')
+        try:
+            fcntl.flock(self._monitor_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._monitor_lock_file.close()
+            self._monitor_lock_file = None
+            logger.info("Otro worker ya ejecuta el monitor de proxies")
+            return
+
+        self.scheduler = BackgroundScheduler(daemon=True)
+        self.scheduler.add_job(
+            self._run_validation,
+            'interval',
+            seconds=Config.VALIDATION_INTERVAL,
+            max_instances=1,
+            coalesce=True
+        )
+        self.scheduler.add_job(
+            prune_access_logs,
+            'interval',
+            hours=6,
+            max_instances=1,
+            coalesce=True
+        )
+        self.scheduler.start()
         logger.info("Monitor de proxies iniciado")
-    
+
     def stop_monitoring(self):
         """Detiene el monitoreo"""
-        self.running = False
-        if self.validation_thread:
-            self.validation_thread.join(timeout=5)
-    
-    def _monitor_loop(self):
-        """Loop principal de monitoreo"""
-        while self.running:
-            try:
-                with app.app_context():
-                    self.validate_all_proxies()
-                time.sleep(Config.VALIDATION_INTERVAL)
-            except Exception as e:
-                logger.error(f"Error en el monitoreo de proxies: {e}")
-                time.sleep(60)
-    
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+        if self._monitor_lock_file is not None:
+            self._monitor_lock_file.close()
+            self._monitor_lock_file = None
+
+    def _run_validation(self):
+        """Job del scheduler: valida todos los proxies en su app context"""
+        try:
+            with app.app_context():
+                self.validate_all_proxies()
+        except Exception as e:
+            logger.error(f"Error en el monitoreo de proxies: {e}")
+
     def validate_all_proxies(self):
-        """Valida todos los proxies activos"""
+        """Valida todos los proxies activos en paralelo"""
         proxies = Proxy.query.filter_by(is_active=True).all()
+        if not proxies:
+            return
+
         logger.info(f"Validando {len(proxies)} proxies...")
-        
-        for proxy in proxies:
-            success, response_time, message = self._test_proxy(proxy)
-            
+
+        # Cada prueba es I/O de red independiente: en paralelo el tiempo
+        # total baja de O(N·timeout) a O(ceil(N/workers)·timeout)
+        with ThreadPoolExecutor(max_workers=min(64, len(proxies))) as executor:
+            results = list(executor.map(self._test_proxy, proxies))
+
+        # Las mutaciones de BD se aplican en serie tras recoger resultados
+        for proxy, (success, response_time, message) in zip(proxies, results):
             if success:
                 proxy.success_count += 1
-                proxy.status_message = "✅ Funcionando"
+                proxy.status_message = f"✅ {message}"
             else:
                 proxy.failure_count += 1
                 proxy.status_message = f"❌ {message}"
@@ -268,32 +479,73 @@ class ProxyManager:
         logger.info("Validación de proxies completada")
     
     def _test_proxy(self, proxy: Proxy) -> Tuple[bool, float, str]:
-        """Prueba un proxy individual"""
-        test_url = "https://httpbin.org/ip"
+        """Prueba un proxy individual.
+
+        Para proxies HTTP basta con una sonda CONNECT a nivel de socket:
+        mide la latencia real del túnel sin pagar handshake TLS ni
+        descarga de cuerpo. Los tipos https/socks mantienen el GET.
+        """
+        if proxy.proxy_type == 'http':
+            return self._probe_connect(proxy)
+        return self._probe_get(proxy)
+
+    def _probe_connect(self, proxy: Proxy) -> Tuple[bool, float, str]:
+        """Sonda CONNECT: 2 RTT en lugar de los ~4 de un GET con TLS"""
+        target = _PROBE_TARGET_HOST
+        headers = {}
+
+        if proxy.has_auth:
+            credentials = base64.b64encode(
+                f"{proxy.username}:{proxy.password}".encode()
+            ).decode()
+            headers['Proxy-Authorization'] = f'Basic {credentials}'
+
+        start_time = time.time()
+        conn = http.client.HTTPConnection(
+            proxy.host, proxy.port, timeout=Config.PROXY_TIMEOUT
+        )
+
+        try:
+            conn.set_tunnel(target, 80, headers=headers)
+            conn.connect()
+            return True, time.time() - start_time, "OK (CONNECT)"
+        except socket.timeout:
+            return False, Config.PROXY_TIMEOUT, "Timeout (CONNECT)"
+        except OSError as e:
+            return False, time.time() - start_time, f"CONNECT: {str(e)[:80]}"
+        finally:
+            conn.close()
+
+    def _probe_get(self, proxy: Proxy) -> Tuple[bool, float, str]:
+        """Sonda GET vía requests para proxies https/socks"""
         proxy_url = f"{proxy.proxy_type}://"
-        
+
         if proxy.has_auth:
             proxy_url += f"{proxy.username}:{proxy.password}@"
-        
+
         proxy_url += f"{proxy.host}:{proxy.port}"
-        
+
         start_time = time.time()
-        
+
         try:
-            response = requests.get(
-                test_url,
+            # stream=True: basta con los headers para saber si funciona,
+            # no hace falta descargar el cuerpo
+            response = self.session.get(
+                Config.PROXY_TEST_URL,
                 proxies={proxy.proxy_type: proxy_url},
                 timeout=Config.PROXY_TIMEOUT,
-                verify=False
+                stream=True
             )
-            
+
             response_time = time.time() - start_time
-            
-            if response.status_code == 200:
-                return True, response_time, "OK"
+            status_code = response.status_code
+            response.close()
+
+            if status_code in (200, 204):
+                return True, response_time, "OK (GET)"
             else:
-                return False, response_time, f"HTTP {response.status_code}"
-                
+                return False, response_time, f"HTTP {status_code}"
+
         except requests.exceptions.Timeout:
             return False, Config.PROXY_TIMEOUT, "Timeout"
         except requests.exceptions.ConnectionError:
@@ -301,20 +553,26 @@ class ProxyManager:
         except Exception as e:
             return False, time.time() - start_time, str(e)[:100]
     
-    def get_best_proxy(self, user: User = None) -> Optional[Proxy]:
-        """Obtiene el mejor proxy disponible"""
+    def get_best_proxy(self, user: User = None, min_success_rate: int = 10) -> Optional[Proxy]:
+        """Obtiene el mejor proxy disponible con una sola fila desde SQL"""
         query = Proxy.query.filter_by(is_active=True)
-        
+
         if user and not user.is_premium:
             query = query.filter(Proxy.username.is_(None))
-        
-        proxies = query.order_by(
+
+        # La tasa de éxito se filtra en SQL (los proxies sin verificar
+        # pasan) y el orden lo cubre ix_proxy_active_pri_rt, así que la
+        # consulta devuelve una sola fila en vez de materializar la tabla
+        query = query.filter(db.or_(
+            Proxy.success_count + Proxy.failure_count == 0,
+            (Proxy.success_count * 100) /
+            (Proxy.success_count + Proxy.failure_count + 1) >= min_success_rate
+        ))
+
+        return query.order_by(
             Proxy.priority.desc(),
-            (Proxy.success_count / (Proxy.success_count + Proxy.failure_count + 1)).desc(),
             Proxy.response_time.asc()
-        ).all()
-        
-        return proxies[0] if proxies else None
+        ).limit(1).first()
 
 # Instancia global del gestor de proxies
 proxy_manager = ProxyManager()
@@ -344,18 +602,99 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Cachés TTL en memoria: evitan un SELECT por petición autenticada y,
+# en el caso de la API, la verificación PBKDF2 (decenas de ms) en cada
+# hit de /play. El RLock es necesario porque Flask sirve con threads.
+_user_cache = TTLCache(maxsize=10000, ttl=60)
+_auth_cache = TTLCache(maxsize=10000, ttl=300)
+_m3u_cache = TTLCache(maxsize=1000, ttl=300)
+_redirect_cache = TTLCache(maxsize=50000, ttl=30)
+_cache_lock = threading.RLock()
+
+# Sal por proceso para las claves de la caché de credenciales: impide
+# reutilizarlas entre reinicios o procesos distintos
+_digest_salt = os.urandom(16)
+
+def _digest(data: bytes, salt: bytes = b'') -> str:
+    """Hash corto y rápido (blake2b-128, 2-4x más rápido que md5/sha256)
+    para claves de caché y ETags"""
+    return hashlib.blake2b(data, digest_size=16, salt=salt).hexdigest()
+
+# Versión global de la lista de canales: forma parte de la clave de la
+# caché M3U, de modo que mutar canales/fuentes invalida todas las listas
+_channels_version = 0
+
+def bump_channels_version():
+    """Invalida las listas M3U cacheadas tras mutar canales o fuentes"""
+    global _channels_version
+    with _cache_lock:
+        _channels_version += 1
+        _m3u_cache.clear()
+
+def invalidate_user_caches(user_id: int, username: str = None):
+    """Invalida las cachés de un usuario (cambio de contraseña, baja, etc.)"""
+    with _cache_lock:
+        _user_cache.pop(user_id, None)
+        if username:
+            for key in [k for k in _auth_cache if k[0] == username]:
+                _auth_cache.pop(key, None)
+
+def _bump_user(user_id: int, count: int = 1, **cols):
+    """Incrementa usage_count (y columnas extra) con un UPDATE atómico.
+
+    Evita el ciclo leer-incrementar-escribir del ORM, que pierde
+    incrementos cuando dos peticiones concurrentes leen el mismo valor.
+    """
+    User.query.filter_by(id=user_id).update(
+        dict(cols, usage_count=User.usage_count + count),
+        synchronize_session=False
+    )
+
+def _get_user_cached(user_id: int) -> Optional[User]:
+    """Carga un usuario por id pasando por la caché TTL"""
+    with _cache_lock:
+        user = _user_cache.get(user_id)
+
+    if user is not None:
+        # Reasociar la instancia cacheada a la sesión actual sin SQL
+        return db.session.merge(user, load=False)
+
+    user = User.query.get(user_id)
+    if user is not None:
+        with _cache_lock:
+            _user_cache[user_id] = user
+    return user
+
 def get_current_user() -> Optional[User]:
     """Obtiene el usuario actual de la sesión"""
     if 'user_id' in session:
-        return User.query.get(session['user_id'])
+        return _get_user_cached(session['user_id'])
     return None
 
 def authenticate_api_user(username: str, password: str) -> Optional[User]:
-    """Autentica usuario para API"""
+    """Autentica usuario para API (con caché de credenciales verificadas)"""
+    # La clave guarda un hash blake2b con sal de proceso de la
+    # contraseña presentada, nunca el texto plano; en hit se omite la
+    # verificación Argon2 costosa
+    cache_key = (username, _digest(password.encode(), salt=_digest_salt))
+
+    with _cache_lock:
+        user_id = _auth_cache.get(cache_key)
+
+    if user_id is not None:
+        user = _get_user_cached(user_id)
+        if user and user.is_active:
+            _bump_user(user.id, last_login=datetime.utcnow())
+            db.session.commit()
+            return user
+        invalidate_user_caches(user_id, username)
+        return None
+
     user = User.query.filter_by(username=username, is_active=True).first()
     if user and user.check_password(password):
-        user.last_login = datetime.utcnow()
-        user.usage_count += 1
+        with _cache_lock:
+            _auth_cache[cache_key] = user.id
+        _bump_user(user.id, last_login=datetime.utcnow())
         db.session.commit()
         return user
     return None
@@ -382,7 +721,7 @@ def login():
         
         if not username or not password:
             flash('Usuario y contraseña son requeridos', 'error')
-            return render_template('login.html')
+            return _compiled_template('login.html').render()
         
         user = User.query.filter_by(username=username, is_active=True).first()
         
@@ -405,7 +744,7 @@ def login():
             flash('Credenciales inválidas', 'error')
             logger.warning(f"Intento de login fallido para {username} desde {request.remote_addr}")
     
-    return render_template('login.html')
+    return _compiled_template('login.html').render()
 
 @app.route('/logout')
 def logout():
@@ -431,53 +770,92 @@ def dashboard():
     
     general_stats = {}
     if current_user.is_admin:
+        # Una sola ida a la BD con subconsultas escalares en lugar de
+        # cuatro COUNT(*) independientes
+        row = db.session.execute(db.text(
+            'SELECT '
+            '(SELECT COUNT(*) FROM "user" WHERE is_active = 1), '
+            '(SELECT COUNT(*) FROM proxy WHERE is_active = 1), '
+            '(SELECT COUNT(*) FROM channel), '
+            '(SELECT COUNT(*) FROM access_log WHERE timestamp > :cutoff)'
+        ), {'cutoff': datetime.utcnow() - timedelta(hours=24)}).one()
+
         general_stats = {
-            'total_users': User.query.filter_by(is_active=True).count(),
-            'total_proxies': Proxy.query.filter_by(is_active=True).count(),
-            'total_channels': Channel.query.count(),
-            'recent_accesses': AccessLog.query.filter(
-                AccessLog.timestamp > datetime.utcnow() - timedelta(hours=24)
-            ).count()
+            'total_users': row[0],
+            'total_proxies': row[1],
+            'total_channels': row[2],
+            'recent_accesses': row[3]
         }
     
-    return render_template('dashboard.html', 
-                         user_stats=user_stats, 
-                         general_stats=general_stats)
+    # stream() emite el HTML por fragmentos: el navegador empieza a
+    # parsear antes de que el render completo termine y no se construye
+    # un string multi-KB por petición
+    stream = _compiled_template('dashboard.html').stream(
+        user_stats=user_stats,
+        general_stats=general_stats
+    )
+    return Response(stream_with_context(stream), mimetype='text/html; charset=utf-8')
 
 # ============================================================================
 # RUTAS DE IPTV
 # ============================================================================
 
+# Patrón precompilado para validar nombres de canal antes de tocar la BD
+_CHANNEL_RE = re.compile(r'^[A-Za-z0-9 _.\-+]{1,200}$')
+
 @app.route('/play')
 @limiter.limit("30/minute")
 def redirect_iptv():
     """Redirección principal de IPTV"""
-    user = request.args.get('user')
-    pwd = request.args.get('pwd')
-    channel = request.args.get('channel')
-    
+    # Leer args y remote_addr una sola vez: cada acceso a request
+    # atraviesa el proxy thread-local de Flask
+    args = request.args
+    user = args.get('user')
+    pwd = args.get('pwd')
+    channel = args.get('channel')
+    remote_addr = request.remote_addr
+
     if not channel or not user or not pwd:
-        logger.warning(f"Parámetros faltantes en /play desde {request.remote_addr}")
+        logger.warning(f"Parámetros faltantes en /play desde {remote_addr}")
         return "Error: Canal no definido o credenciales faltantes", 400
-    
+
+    if not _CHANNEL_RE.match(channel):
+        logger.warning(f"Nombre de canal inválido en /play desde {remote_addr}")
+        return "Error: Canal inválido", 400
+
     authenticated_user = authenticate_api_user(user, pwd)
     if not authenticated_user:
-        logger.warning(f"Autenticación fallida para {user} desde {request.remote_addr}")
+        logger.warning(f"Autenticación fallida para {user} desde {remote_addr}")
         return "Error: Credenciales inválidas", 401
     
-    # Buscar canal (implementación simplificada)
-    best_url = find_best_channel_url(channel, authenticated_user)
-    if not best_url:
-        logger.warning(f"Canal {channel} no encontrado")
-        return "Error: Canal no encontrado", 404
-    
-    # Registrar acceso
-    log_access(authenticated_user, channel, best_url)
-    
+    # La redirección es determinista por (canal, nivel de usuario)
+    # durante el TTL: cachear la Response completa deja el hit en un
+    # lookup de dict + escritura al socket
+    cache_key = (channel, authenticated_user.is_premium)
+    with _cache_lock:
+        response = _redirect_cache.get(cache_key)
+
+    if response is None:
+        # Buscar canal (implementación simplificada)
+        best_url = find_best_channel_url(channel, authenticated_user)
+        if not best_url:
+            logger.warning(f"Canal {channel} no encontrado")
+            return "Error: Canal no encontrado", 404
+
+        response = Response("", status=302, headers={
+            'Location': best_url,
+            'Cache-Control': 'no-store'
+        })
+        # Sin iteración/codificación del cuerpo por parte de Flask
+        response.direct_passthrough = True
+
+        with _cache_lock:
+            _redirect_cache[cache_key] = response
+
+    # Registrar acceso (encolado, no toca disco en el hot path)
+    log_access(authenticated_user, channel, response.headers['Location'])
+
     logger.info(f"Redirigiendo canal {channel} para usuario {user}")
-    
-    response = make_response("", 302)
-    response.headers["Location"] = best_url
     return response
 
 @app.route('/list')
@@ -489,21 +867,44 @@ def get_iptv():
     
     if not user or not pwd:
         return "Error: Credenciales requeridas", 400
-    
+
     authenticated_user = authenticate_api_user(user, pwd)
     if not authenticated_user:
         return "Error: Credenciales inválidas", 401
-    
-    m3u_content = generate_m3u_for_user(authenticated_user)
-    
+
+    # El contenido solo depende del usuario, del host y de la versión de
+    # canales: en hit repetido no hay trabajo de BD ni re-codificación
+    cache_key = (
+        authenticated_user.id,
+        authenticated_user.is_premium,
+        request.host,
+        _channels_version
+    )
+
+    with _cache_lock:
+        cached = _m3u_cache.get(cache_key)
+
+    if cached is None:
+        body = b''.join(generate_m3u_for_user(authenticated_user))
+        etag = _digest(body)
+        with _cache_lock:
+            _m3u_cache[cache_key] = (etag, body)
+    else:
+        etag, body = cached
+
+    # Con ETag coincidente basta un 304 de ~200 bytes en vez del M3U
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+
     response = Response(
-        m3u_content,
+        body,
         mimetype='application/octet-stream',
         headers={
-            'Content-Disposition': f'attachment; filename=iptv_{user}.m3u'
+            'Content-Disposition': f'attachment; filename=iptv_{user}.m3u',
+            'ETag': etag
         }
     )
-    
+
     logger.info(f"Lista M3U generada para usuario {user}")
     return response
 
@@ -519,188 +920,201 @@ def api_status():
         'active_proxies': active_proxies,
         'total_channels': total_channels,
         'active_sources': active_sources,
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow()
     })
 
 # ============================================================================
 # FUNCIONES AUXILIARES
 # ============================================================================
 
-def find_best_channel_url(channel_name: str, user: User) -> str:
-    """Encuentra la mejor URL para un canal (implementación simplificada)"""
-    # En un sistema real, esto buscaría en la base de datos
-    # Por ahora devolvemos una URL de ejemplo
+# Canales de ejemplo de la implementación simplificada; en un sistema
+# real vendrían de Channel/ChannelURL
+_SAMPLE_CHANNELS = [
+    {"name": "Canal 1", "group": "Nacionales"},
+    {"name": "Canal 2", "group": "Nacionales"},
+    {"name": "Movie Channel", "group": "Películas"},
+    {"name": "Sports HD", "group": "Deportes"}
+]
+_SAMPLE_CHANNEL_NAMES = frozenset(c["name"] for c in _SAMPLE_CHANNELS)
+
+# Caché de resolución canal→URL; la negativa (canal inexistente) tiene
+# TTL corto para que peticiones repetidas a canales malos no toquen la BD
+_channel_url_cache = TTLCache(maxsize=50000, ttl=30)
+_channel_not_found_cache = TTLCache(maxsize=10000, ttl=5)
+
+def _resolve_channel_url(channel_name: str, user: User) -> Optional[str]:
+    """Resuelve la URL de un canal (stub del lookup real en la BD)"""
+    if channel_name not in _SAMPLE_CHANNEL_NAMES:
+        return None
     return f"https://example.com/stream/{channel_name}.m3u8"
 
-def generate_m3u_for_user(user: User) -> str:
-    """Genera contenido M3U personalizado para un usuario"""
-    m3u_lines = ["#EXTM3U"]
-    
-    # Ejemplo de canales
-    sample_channels = [
-        {"name": "Canal 1", "group": "Nacionales"},
-        {"name": "Canal 2", "group": "Nacionales"},
-        {"name": "Movie Channel", "group": "Películas"},
-        {"name": "Sports HD", "group": "Deportes"}
-    ]
-    
+def find_best_channel_url(channel_name: str, user: User) -> Optional[str]:
+    """Encuentra la mejor URL para un canal (implementación simplificada)"""
+    key = (channel_name, user.is_premium, _channels_version)
+
+    with _cache_lock:
+        if key in _channel_not_found_cache:
+            return None
+        url = _channel_url_cache.get(key)
+
+    if url is not None:
+        return url
+
+    url = _resolve_channel_url(channel_name, user)
+
+    with _cache_lock:
+        if url is None:
+            _channel_not_found_cache[key] = True
+        else:
+            _channel_url_cache[key] = url
+
+    return url
+
+def generate_m3u_for_user(user: User) -> Iterator[bytes]:
+    """Genera el contenido M3U de un usuario como chunks de bytes.
+
+    Emitir bytes directamente evita las copias intermedias (lista de
+    str, join y re-codificación de Flask) y permite hacer streaming al
+    cliente con memoria constante aunque la lista crezca a miles de
+    canales.
+    """
+    yield b"#EXTM3U\n"
+
+    sample_channels = _SAMPLE_CHANNELS
+
+    host = request.host.encode()
+    username = user.username.encode()
+
     for channel in sample_channels:
-        extinf = f"#EXTINF:-1 group-title=\"{channel['group']}\",{channel['name']}"
-        play_url = f"http://{request.host}/play?user={user.username}&pwd=dummy&channel={channel['name']}"
-        
-        m3u_lines.extend([extinf, play_url])
-    
-    return '\n'.join(m3u_lines)
+        name = channel['name'].encode()
+        yield b'#EXTINF:-1 group-title="%b",%b\nhttp://%b/play?user=%b&pwd=dummy&channel=%b\n' % (
+            channel['group'].encode(),
+            name,
+            host,
+            username,
+            name
+        )
+
+# Cola acotada de accesos pendientes: el endpoint solo encola y un hilo
+# en segundo plano vuelca lotes con un único commit, en lugar de pagar
+# un fsync por cada petición a /play
+_access_log_queue = queue.Queue(maxsize=10000)
+ACCESS_LOG_BATCH_SIZE = 500
+ACCESS_LOG_FLUSH_INTERVAL = 0.2  # segundos
+
+def _flush_access_logs():
+    """Loop del hilo que vuelca los logs de acceso por lotes"""
+    while True:
+        batch = [_access_log_queue.get()]
+        deadline = time.time() + ACCESS_LOG_FLUSH_INTERVAL
+
+        while len(batch) < ACCESS_LOG_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_access_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        try:
+            with app.app_context():
+                db.session.bulk_insert_mappings(AccessLog, batch)
+
+                # Un solo UPDATE atómico por usuario en lugar de uno
+                # por acceso
+                usage_counts = Counter(
+                    row['user_id'] for row in batch if row['user_id']
+                )
+                for user_id, count in usage_counts.items():
+                    _bump_user(user_id, count)
+
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Error al volcar logs de acceso: {e}")
+            with app.app_context():
+                db.session.rollback()
+
+_access_log_thread = threading.Thread(target=_flush_access_logs, daemon=True)
+_access_log_thread.start()
+
+def prune_access_logs():
+    """Elimina logs de acceso antiguos en lotes de 10k filas.
+
+    Mantener la tabla acotada conserva baratos los checkpoints del WAL
+    y los COUNT del dashboard; el borrado por lotes evita retener el
+    write lock durante todo el prune.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=Config.ACCESS_LOG_RETENTION_DAYS)
+
+    with app.app_context():
+        try:
+            if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+                deleted = 0
+                while True:
+                    result = db.session.execute(db.text(
+                        'DELETE FROM access_log WHERE rowid IN ('
+                        'SELECT rowid FROM access_log WHERE timestamp < :cutoff LIMIT 10000)'
+                    ), {'cutoff': cutoff})
+                    db.session.commit()
+                    deleted += result.rowcount
+                    if result.rowcount == 0:
+                        break
+                # Compactar el WAL tras el borrado masivo
+                db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+                db.session.commit()
+            else:
+                result = db.session.execute(db.text(
+                    'DELETE FROM access_log WHERE timestamp < :cutoff'
+                ), {'cutoff': cutoff})
+                db.session.commit()
+                deleted = result.rowcount
+
+            if deleted:
+                logger.info(f"Prune de logs de acceso: {deleted} filas eliminadas")
+        except Exception as e:
+            logger.error(f"Error en el prune de logs de acceso: {e}")
+            db.session.rollback()
 
 def log_access(user: User, channel_name: str, url: str, proxy: Proxy = None):
-    """Registra un acceso para estadísticas"""
+    """Registra un acceso para estadísticas (encolado, sin tocar disco)"""
+    entry = {
+        'user_id': user.id,
+        'ip_address': request.remote_addr,
+        'channel_name': channel_name,
+        'url_accessed': url,
+        'proxy_used': f"{proxy.host}:{proxy.port}" if proxy else "direct",
+        'timestamp': datetime.utcnow(),
+        'success': True
+    }
+
     try:
-        access_log = AccessLog(
-            user_id=user.id,
-            ip_address=request.remote_addr,
-            channel_name=channel_name,
-            url_accessed=url,
-            proxy_used=f"{proxy.host}:{proxy.port}" if proxy else "direct",
-            timestamp=datetime.utcnow(),
-            success=True
-        )
-        
-        db.session.add(access_log)
-        user.usage_count += 1
-        db.session.commit()
-        
-    except Exception as e:
-        logger.error(f"Error al registrar acceso: {e}")
-        db.session.rollback()
+        _access_log_queue.put_nowait(entry)
+    except queue.Full:
+        # Cola llena: descartar el acceso más antiguo y reintentar
+        try:
+            _access_log_queue.get_nowait()
+            _access_log_queue.put_nowait(entry)
+        except (queue.Empty, queue.Full):
+            logger.warning("Cola de logs de acceso llena, acceso descartado")
 
 # ============================================================================
-# TEMPLATES EMBEBIDOS (Para simplificar el deployment)
+# TEMPLATES (servidos desde templates/ por el renderer cacheado de Flask)
 # ============================================================================
 
+@lru_cache(maxsize=None)
+def _compiled_template(name: str):
+    """Devuelve el template Jinja compilado, memoizado por nombre.
+
+    El conjunto de templates es fijo y minúsculo, así que una caché sin
+    límite es segura y evita el lookup del loader en cada render.
+    """
+    return app.jinja_env.get_template(name)
+
 @app.route('/login.html')
 def serve_login_template():
-    """Template de login embebido"""
-    return '''
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Login - IPTV Multi-Proxy</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css" rel="stylesheet">
-</head>
-<body class="bg-light">
-    <div class="container">
-        <div class="row justify-content-center align-items-center min-vh-100">
-            <div class="col-md-6 col-lg-4">
-                <div class="card shadow">
-                    <div class="card-header bg-primary text-white text-center">
-                        <h4><i class="bi bi-shield-lock me-2"></i>IPTV Multi-Proxy</h4>
-                    </div>
-                    <div class="card-body">
-                        {% with messages = get_flashed_messages(with_categories=true) %}
-                            {% if messages %}
-                                {% for category, message in messages %}
-                                    <div class="alert alert-{{ 'danger' if category == 'error' else category }}">{{ message }}</div>
-                                {% endfor %}
-                            {% endif %}
-                        {% endwith %}
-                        
-                        <form method="POST">
-                            <div class="mb-3">
-                                <label for="username" class="form-label">Usuario</label>
-                                <input type="text" class="form-control" id="username" name="username" required>
-                            </div>
-                            <div class="mb-3">
-                                <label for="password" class="form-label">Contraseña</label>
-                                <input type="password" class="form-control" id="password" name="password" required>
-                            </div>
-                            <button type="submit" class="btn btn-primary w-100">Iniciar Sesión</button>
-                        </form>
-                    </div>
-                </div>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-    '''
-
-# Función para renderizar templates (simplificada)
-def render_template(template_name, **kwargs):
-    """Renderizar templates de forma simplificada"""
-    if template_name == 'login.html':
-        return serve_login_template()
-    elif template_name == 'dashboard.html':
-        return f'''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Dashboard - IPTV Multi-Proxy</title>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css" rel="stylesheet">
-</head>
-<body>
-    <nav class="navbar navbar-dark bg-dark">
-        <div class="container">
-            <span class="navbar-brand">IPTV Multi-Proxy - Dashboard</span>
-            <a href="/logout" class="btn btn-outline-light">Cerrar Sesión</a>
-        </div>
-    </nav>
-    
-    <div class="container mt-4">
-        <h1>Bienvenido, {session.get('username', 'Usuario')}</h1>
-        
-        <div class="row mt-4">
-            <div class="col-md-3">
-                <div class="card text-center">
-                    <div class="card-body">
-                        <h5 class="card-title">Uso Total</h5>
-                        <p class="card-text display-6">{kwargs.get('user_stats', {}).get('usage_count', 0)}</p>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="col-md-3">
-                <div class="card text-center">
-                    <div class="card-body">
-                        <h5 class="card-title">Tipo de Cuenta</h5>
-                        <p class="card-text">
-                            <span class="badge bg-{'warning' if session.get('is_admin') else 'success' if kwargs.get('user_stats', {}).get('is_premium') else 'secondary'}">
-                                {'Admin' if session.get('is_admin') else 'Premium' if kwargs.get('user_stats', {}).get('is_premium') else 'Estándar'}
-                            </span>
-                        </p>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="mt-4">
-            <h3>Acciones Rápidas</h3>
-            <div class="btn-group" role="group">
-                <button class="btn btn-primary" onclick="downloadM3U()">Descargar Lista M3U</button>
-                <button class="btn btn-success" onclick="checkStatus()">Ver Estado</button>
-            </div>
-        </div>
-    </div>
-    
-    <script>
-        function downloadM3U() {{
-            window.location.href = '/list?user={session.get('username')}&pwd=dummy';
-        }}
-        
-        function checkStatus() {{
-            fetch('/api/status')
-                .then(response => response.json())
-                .then(data => alert('Proxies activos: ' + data.active_proxies + '\\nCanales: ' + data.total_channels));
-        }}
-    </script>
-</body>
-</html>
-        '''
-    
-    return f"<h1>Template {template_name} no encontrado</h1>"
+    """Template de login (compilado y cacheado por Jinja)"""
+    return _compiled_template('login.html').render()
 
 # ============================================================================
 # INICIALIZACIÓN Y EJECUCIÓN
@@ -710,44 +1124,44 @@ def initialize_database():
     """Inicializar base de datos con datos de ejemplo"""
     with app.app_context():
         db.create_all()
-        
-        # Crear usuario admin por defecto
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(
+
+        # Usuarios semilla: el hash se precalcula y se pasa directo al
+        # constructor para poder guardarlos con bulk_save_objects, que
+        # evita el bookkeeping del identity map por instancia
+        seed_users = []
+
+        if not User.query.filter_by(username='admin').first():
+            seed_users.append(User(
                 username='admin',
+                password_hash=_password_hasher.hash('admin123'),
                 is_admin=True,
                 is_premium=True,
                 is_active=True
-            )
-            admin.set_password('admin123')
-            db.session.add(admin)
-        
-        # Crear usuario de prueba
-        user = User.query.filter_by(username='demo').first()
-        if not user:
-            user = User(
+            ))
+
+        if not User.query.filter_by(username='demo').first():
+            seed_users.append(User(
                 username='demo',
+                password_hash=_password_hasher.hash('demo123'),
                 is_premium=False,
                 is_admin=False,
                 is_active=True
-            )
-            user.set_password('demo123')
-            db.session.add(user)
-        
-        # Agregar proxies de ejemplo
-        if Proxy.query.count() == 0:
-            sample_proxies = [
+            ))
+
+        if seed_users:
+            db.session.bulk_save_objects(seed_users)
+
+        # Agregar proxies de ejemplo en un solo lote; la comprobación de
+        # existencia se detiene en la primera fila, sin COUNT(*) O(n)
+        if not db.session.query(Proxy.id).first():
+            db.session.bulk_save_objects([
                 Proxy(host='147.75.113.227', port=8080, proxy_type='http', priority=7),
                 Proxy(host='95.216.64.229', port=3128, proxy_type='http', priority=6),
                 Proxy(host='proxy.example.com', port=8080, username='user', password='pass', proxy_type='http', priority=8)
-            ]
-            
-            for proxy in sample_proxies:
-                db.session.add(proxy)
-        
+            ])
+
         # Agregar fuente M3U de ejemplo
-        if M3USource.query.count() == 0:
+        if not db.session.query(M3USource.id).first():
             source = M3USource(
                 name='Lista de Ejemplo',
                 url='https://example.com/playlist.m3u',
@@ -756,7 +1170,7 @@ def initialize_database():
                 channels_count=4
             )
             db.session.add(source)
-        
+
         db.session.commit()
         logger.info("Base de datos inicializada con datos de ejemplo")
 
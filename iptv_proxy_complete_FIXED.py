@@ -10,20 +10,31 @@ Sistema completo de gestión de proxies e IPTV con interfaz de administración
 - Configuración mejorada
 """
 
+import atexit
 import os
 import sys
 import logging
+import logging.handlers
+import queue
 from datetime import datetime, timedelta
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session, flash, Response, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, make_response
 from flask_sqlalchemy import SQLAlchemy
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import gzip
+import hashlib
+import sqlite3
 import threading
 import time
 import json
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import text
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
 from typing import List, Dict, Optional, Tuple
 import re
 from urllib.parse import urlparse
@@ -48,10 +59,18 @@ class Config:
     VALIDATION_INTERVAL = int(os.environ.get('VALIDATION_INTERVAL', 300))  # 5 minutos
     RATE_LIMIT_DEFAULT = os.environ.get('RATE_LIMIT_DEFAULT', "100/hour")
 
+# Evita repetir la comprobación de directorios en cada proceso que importa
+# el módulo (tests, helpers, workers de gunicorn): se paga una sola vez
+_DIRS_OK = False
+
 def create_required_directories():
     """Crear directorios necesarios con manejo de errores MEJORADO"""
+    global _DIRS_OK
+    if _DIRS_OK:
+        return
+
     directories = [Config.DATA_DIR, Config.LOGS_DIR]
-    
+
     for directory in directories:
         try:
             os.makedirs(directory, exist_ok=True)
@@ -70,18 +89,29 @@ def create_required_directories():
             print(f"❌ Error creando directorio {directory}: {e}")
             sys.exit(1)
 
-# Crear directorios al importar el módulo
-create_required_directories()
+    _DIRS_OK = True
 
 # Configuración de logging profesional - CON RUTA CORREGIDA
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(Config.LOGS_DIR, 'iptv_proxy.log')),
-        logging.StreamHandler()
-    ]
+# Los hilos de petición sólo encolan los registros; un QueueListener en
+# segundo plano hace las escrituras a archivo/consola fuera del camino
+# crítico, sin contención en el lock del FileHandler
+_log_queue = queue.SimpleQueue()
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_file_handler = logging.FileHandler(os.path.join(Config.LOGS_DIR, 'iptv_proxy.log'), delay=True)
+_log_file_handler.setFormatter(_log_formatter)
+_log_stream_handler = logging.StreamHandler()
+_log_stream_handler.setFormatter(_log_formatter)
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, _log_file_handler, _log_stream_handler, respect_handler_level=True
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# El QueueHandler formatea antes de encolar; con '%(message)s' se deja el
+# formato completo a los handlers del listener y se evita duplicarlo
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
 logger = logging.getLogger(__name__)
 
 # Inicialización de la aplicación
@@ -96,10 +126,35 @@ limiter = Limiter(
     default_limits=[Config.RATE_LIMIT_DEFAULT]
 )
 
+
+@sqlalchemy_event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Configurar SQLite para concurrencia con Flask threaded=True.
+
+    WAL permite lectores concurrentes con un escritor y synchronous=NORMAL
+    evita el fsync por commit del modo FULL; el resto amplía caché y mmap.
+    """
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
 # ============================================================================
 # MODELOS DE BASE DE DATOS (IGUALES AL ORIGINAL)
 # ============================================================================
 
+# Coste del KDF elegido a propósito: el método por defecto de werkzeug
+# (600k iteraciones) tarda cientos de ms por login; 150k sigue siendo un
+# coste razonable y los hashes antiguos se verifican igual porque el
+# método va codificado dentro de cada hash
+_PBKDF2_METHOD = os.environ.get('PBKDF2_METHOD', 'pbkdf2:sha256:150000')
+
 class User(db.Model):
     """Modelo de usuario con diferentes niveles de acceso"""
     id = db.Column(db.Integer, primary_key=True)
@@ -114,7 +169,7 @@ class User(db.Model):
     bandwidth_used = db.Column(db.BigInteger, default=0)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=_PBKDF2_METHOD)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -175,12 +230,22 @@ class Proxy(db.Model):
             'priority': self.priority
         }
 
+# Sesión HTTP compartida para todo el módulo: reutiliza conexiones (y
+# sesiones TLS) en lugar de crear un pool nuevo por cada requests.get()
+_HTTP = requests.Session()
+_http_adapter = HTTPAdapter(pool_connections=64, pool_maxsize=64, max_retries=0)
+_HTTP.mount('http://', _http_adapter)
+_HTTP.mount('https://', _http_adapter)
+
 # Gestión de proxy simplificada para esta versión corregida
 class ProxyManager:
     """Gestor de proxies simplificado"""
     def __init__(self):
         self.monitoring = False
         self.monitor_thread = None
+        # Todas las comprobaciones salientes deben ir por la sesión
+        # compartida, no por requests.get directo
+        self.session = _HTTP
     
     def start_monitoring(self):
         """Iniciar monitoreo de proxies"""
@@ -198,10 +263,9 @@ proxy_manager = ProxyManager()
 # RUTAS BÁSICAS PARA PRUEBA
 # ============================================================================
 
-@app.route('/')
-def dashboard():
-    """Dashboard principal"""
-    return f'''
+# El dashboard es HTML constante respecto a Config: se construye una
+# sola vez al importar y se sirve con ETag para poder responder 304
+_DASHBOARD_HTML = f'''
     <!DOCTYPE html>
     <html>
     <head>
@@ -244,17 +308,84 @@ def dashboard():
         </div>
     </body>
     </html>
-    '''
+    '''.encode('utf-8')
+
+_DASHBOARD_ETAG = hashlib.md5(_DASHBOARD_HTML).hexdigest()
+
+# Compresión anticipada: el HTML no cambia tras el import, así que se
+# comprime una sola vez aquí en vez de por petición. brotli es opcional;
+# gzip (stdlib) cubre al resto de clientes
+_DASHBOARD_GZ = gzip.compress(_DASHBOARD_HTML, compresslevel=9)
+try:
+    import brotli
+    _DASHBOARD_BR = brotli.compress(_DASHBOARD_HTML, quality=11)
+except ImportError:
+    _DASHBOARD_BR = None
+
+@app.route('/')
+def dashboard():
+    """Dashboard principal"""
+    # Si el navegador ya tiene esta versión, un 304 de ~200 bytes basta
+    if request.headers.get('If-None-Match') == _DASHBOARD_ETAG:
+        return Response(status=304, headers={'ETag': _DASHBOARD_ETAG})
+
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    body = _DASHBOARD_HTML
+    encoding = None
+    if _DASHBOARD_BR is not None and 'br' in accept_encoding:
+        body, encoding = _DASHBOARD_BR, 'br'
+    elif 'gzip' in accept_encoding:
+        body, encoding = _DASHBOARD_GZ, 'gzip'
+
+    headers = {
+        'ETag': _DASHBOARD_ETAG,
+        'Cache-Control': 'public, max-age=300',
+        'Vary': 'Accept-Encoding',
+        # Cuerpo en bytes ya codificado: longitud conocida de antemano
+        'Content-Length': str(len(body))
+    }
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    # direct_passthrough evita que Flask envuelva/copie el iterador WSGI
+    # para un cuerpo de bytes que ya está listo para enviar
+    resp = Response(body, mimetype='text/html', headers=headers,
+                    direct_passthrough=True)
+    return resp
+
+# Serialización JSON con orjson (extensión en C, 3-5x más rápida que el
+# json estándar que usa jsonify); las cabeceras son siempre las mismas
+def ojson(payload, status=200):
+    return Response(orjson.dumps(payload, default=str), status=status,
+                    mimetype='application/json')
+
+# Caché corta para /api/status: los dashboards sondean este endpoint y
+# no hace falta pagar dos COUNT(*) por cada hit
+_status_cache = {'t': 0.0, 'v': None}
+_status_cache_lock = threading.Lock()
+STATUS_CACHE_TTL = 2.0  # segundos
 
 @app.route('/api/status')
 def api_status():
     """Estado del sistema"""
     try:
-        # Probar conexión a base de datos
-        user_count = User.query.count()
-        proxy_count = Proxy.query.count()
-        
-        return jsonify({
+        now = time.monotonic()
+        with _status_cache_lock:
+            counts = _status_cache['v'] if now - _status_cache['t'] <= STATUS_CACHE_TTL else None
+
+        if counts is None:
+            # Probar conexión a base de datos: ambos contadores en una
+            # sola consulta en lugar de dos idas a SQLite
+            row = db.session.execute(text(
+                'SELECT (SELECT COUNT(*) FROM "user"), (SELECT COUNT(*) FROM proxy)'
+            )).first()
+            counts = (row[0], row[1])
+            with _status_cache_lock:
+                _status_cache['v'] = counts
+                _status_cache['t'] = now
+
+        user_count, proxy_count = counts
+
+        return ojson({
             'status': 'success',
             'database': 'connected',
             'database_path': Config.DATABASE_PATH,
@@ -263,57 +394,87 @@ def api_status():
             'message': 'Sistema funcionando correctamente'
         })
     except Exception as e:
-        return jsonify({
+        return ojson({
             'status': 'error',
             'error': str(e)
-        }), 500
+        }, status=500)
 
 @app.route('/test-db')
 def test_database():
     """Probar operaciones de base de datos"""
     try:
-        # Crear tabla de prueba
-        db.engine.execute("CREATE TABLE IF NOT EXISTS test_connection (id INTEGER PRIMARY KEY, test_data TEXT)")
-        
-        # Insertar dato de prueba
-        db.engine.execute("INSERT INTO test_connection (test_data) VALUES ('Conexión exitosa')")
-        
-        # Leer dato de prueba
-        result = db.engine.execute("SELECT test_data FROM test_connection LIMIT 1").fetchone()
-        
-        # Limpiar
-        db.engine.execute("DROP TABLE test_connection")
+        # Una sola conexión del pool y una sola transacción para las
+        # cuatro operaciones, con SQL parametrizado
+        with db.engine.begin() as conn:
+            # Crear tabla de prueba
+            conn.execute(text(
+                "CREATE TABLE IF NOT EXISTS test_connection (id INTEGER PRIMARY KEY, test_data TEXT)"
+            ))
+
+            # Insertar dato de prueba
+            conn.execute(
+                text("INSERT INTO test_connection (test_data) VALUES (:dato)"),
+                {'dato': 'Conexión exitosa'}
+            )
+
+            # Leer dato de prueba
+            result = conn.execute(
+                text("SELECT test_data FROM test_connection LIMIT 1")
+            ).fetchone()
+
+            # Limpiar
+            conn.execute(text("DROP TABLE test_connection"))
         
-        return jsonify({
+        return ojson({
             'status': 'success',
             'message': 'Base de datos funcionando perfectamente',
             'test_result': result[0] if result else 'Sin datos',
             'database_path': Config.DATABASE_PATH
         })
-        
+
     except Exception as e:
-        return jsonify({
+        return ojson({
             'status': 'error',
             'error': str(e),
             'database_path': Config.DATABASE_PATH
-        }), 500
+        }, status=500)
 
 # ============================================================================
 # INICIALIZACIÓN MEJORADA CON MANEJO DE ERRORES
 # ============================================================================
 
+# Hashes de los usuarios semilla, calculados una sola vez al importar y
+# solo si la base de datos aún no existe: en arranques idempotentes los
+# usuarios ya están creados y no hay que pagar el KDF (PBKDF2) de nuevo
+if not os.path.exists(Config.DATABASE_PATH):
+    _ADMIN_PASSWORD_HASH = generate_password_hash('admin123', method=_PBKDF2_METHOD)
+    _DEMO_PASSWORD_HASH = generate_password_hash('demo123', method=_PBKDF2_METHOD)
+else:
+    _ADMIN_PASSWORD_HASH = None
+    _DEMO_PASSWORD_HASH = None
+
 def initialize_database():
     """Inicializar base de datos con manejo de errores mejorado"""
     try:
+        create_required_directories()
         with app.app_context():
             # Verificar que la base de datos es accesible
             print(f"📍 Creando tablas en: {Config.DATABASE_PATH}")
             
             db.create_all()
             logger.info("✅ Tablas de base de datos creadas exitosamente")
-            
+
+            # Ambas comprobaciones de existencia en una sola consulta O(1);
+            # EXISTS se detiene en la primera fila en lugar de contar toda
+            # la tabla, y si no hay usuarios nos ahorramos también los
+            # SELECT por nombre de abajo
+            row = db.session.execute(text(
+                'SELECT EXISTS(SELECT 1 FROM "user"), EXISTS(SELECT 1 FROM proxy)'
+            )).first()
+            has_users, has_proxies = row[0], row[1]
+
             # Crear usuario admin por defecto
-            admin = User.query.filter_by(username='admin').first()
+            admin = User.query.filter_by(username='admin').first() if has_users else None
             if not admin:
                 admin = User(
                     username='admin',
@@ -321,12 +482,12 @@ def initialize_database():
                     is_premium=True,
                     is_active=True
                 )
-                admin.set_password('admin123')
+                admin.password_hash = _ADMIN_PASSWORD_HASH or generate_password_hash('admin123', method=_PBKDF2_METHOD)
                 db.session.add(admin)
                 logger.info("✅ Usuario admin creado")
             
             # Crear usuario de prueba
-            user = User.query.filter_by(username='demo').first()
+            user = User.query.filter_by(username='demo').first() if has_users else None
             if not user:
                 user = User(
                     username='demo',
@@ -334,12 +495,12 @@ def initialize_database():
                     is_admin=False,
                     is_active=True
                 )
-                user.set_password('demo123')
+                user.password_hash = _DEMO_PASSWORD_HASH or generate_password_hash('demo123', method=_PBKDF2_METHOD)
                 db.session.add(user)
                 logger.info("✅ Usuario demo creado")
             
             # Agregar proxy de ejemplo
-            if Proxy.query.count() == 0:
+            if not has_proxies:
                 proxy = Proxy(
                     host='proxy.example.com',
                     port=8080,
@@ -363,13 +524,24 @@ def initialize_database():
         print(f"   - Ruta accesible: {Config.DATABASE_PATH}")
         return False
 
+# Arranque bajo gunicorn (run_production.sh): el bloque __main__ no se
+# ejecuta al importar el módulo, así que cada worker inicializa aquí
+if os.environ.get('IPTV_PRODUCTION') == '1':
+    create_required_directories()
+    if not initialize_database():
+        sys.exit(1)
+    proxy_manager.start_monitoring()
+
 if __name__ == '__main__':
     print("🚀 IPTV Multi-Proxy Service - Versión CORREGIDA")
     print("=" * 60)
     print(f"📁 Directorio base: {Config.BASE_DIR}")
     print(f"💾 Base de datos: {Config.DATABASE_PATH}")
     print("=" * 60)
-    
+
+    create_required_directories()
+
+
     # Inicializar base de datos con manejo de errores
     if initialize_database():
         print("✅ Inicialización exitosa")
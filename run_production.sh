@@ -0,0 +1,33 @@
+#!/bin/bash
+
+# ============================================================================
+# 🚀 SERVIDOR DE PRODUCCIÓN - IPTV MULTI-PROXY
+# ============================================================================
+# El servidor de desarrollo de Werkzeug (app.run) es monoproceso y crea un
+# hilo por petición; gunicorn usa varios workers con un parser HTTP mucho
+# más rápido. Uso: ./run_production.sh  (WORKERS y PORT son configurables)
+# ============================================================================
+
+set -e
+
+WORKERS=${WORKERS:-$(nproc)}
+PORT=${PORT:-5051}
+
+echo "🚀 IPTV Multi-Proxy - Servidor de producción (gunicorn)"
+echo "============================================================"
+echo "👷 Workers: $WORKERS (8 hilos cada uno)"
+echo "🌐 Escuchando en: http://0.0.0.0:$PORT"
+echo "============================================================"
+
+# IPTV_PRODUCTION=1 hace que cada worker inicialice la base de datos y el
+# monitoreo de proxies al importar el módulo (el bloque __main__ no se
+# ejecuta bajo gunicorn)
+export IPTV_PRODUCTION=1
+
+exec gunicorn \
+    --workers "$WORKERS" \
+    --threads 8 \
+    --worker-class gthread \
+    --bind "0.0.0.0:$PORT" \
+    --access-logfile - \
+    iptv_proxy_complete_FIXED:app